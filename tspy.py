@@ -1,28 +1,106 @@
 #!/usr/bin/env python3
 
 import argparse
+import ctypes
+import errno
+import io
+import shutil
 import sqlite3
 import os
+import re
+import shlex
+import sys
 import subprocess
+import select
 import time
 import uuid
 import signal
 from datetime import datetime, timezone, timedelta
-from threading import Thread, Lock
+from queue import Empty, SimpleQueue
+from threading import Thread, Lock, local
 
 parent_dir = os.path.dirname(os.path.abspath(__file__))
 logo_file = os.path.join(parent_dir, "logo")
-if os.path.exists(logo_file):
-    with open(logo_file, "r") as f:
-        logo = f.read()
 DB_FILE = os.path.expanduser("~/.tspy_queue.db")
 JOB_OUT_DIR = os.path.expanduser("~/.tspy_out")
+WAKE_FIFO = os.path.expanduser("~/.tspy_wake")
 DEFAULT_JOBS = 1
+SCHEMA_VERSION = 1
+STATUS_LIMIT = 1000
+_ROW_TPL = "{:<8} {:<10} {:<3} {:<3} {:<6} {:<6} {:<6} {:<20} {:<20} {:<20} {:<16} {}\n"
 JST = timezone(timedelta(hours=9))
+_tls = local()
+_write_lock = Lock()
+_writer_conn = None
+_finalize_q = SimpleQueue()
+FINALIZE_WINDOW = 0.05
+FINALIZE_RETRY = 1.0
+IN_MODIFY = 0x2
+_SHELL_META = re.compile(r"[|&;<>*?${}()\[\]\"'\\~`#!\n]")
+_SHELL_BUILTINS = {
+    ".", ":", "alias", "bg", "break", "case", "cd", "command", "continue", "do", "done",
+    "elif", "else", "esac", "eval", "exec", "exit", "export", "fg", "fi", "for", "function",
+    "getopts", "hash", "if", "jobs", "read", "readonly", "return", "set", "shift", "source",
+    "then", "times", "trap", "type", "ulimit", "umask", "unalias", "unset", "until", "wait", "while",
+}
+
+
+def _load_logo():
+    try:
+        with open(logo_file, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _timestamp():
+    ts = time.time_ns()
+    return ts, datetime.fromtimestamp(ts / 1e9, JST).isoformat()
+
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(ts / 1e9, JST).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _connect(check_same_thread=True):
+    conn = sqlite3.connect(DB_FILE, timeout=5.0, isolation_level=None,
+                           check_same_thread=check_same_thread, cached_statements=256)
+    conn.executescript("""
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        PRAGMA foreign_keys=ON;
+    """)
+    return conn
+
+
+def _conn():
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        conn = _tls.conn = _connect()
+    return conn
+
+
+def _write(sql, params=(), many=False):
+    global _writer_conn
+    with _write_lock:
+        if _writer_conn is None:
+            _writer_conn = _connect(check_same_thread=False)
+        _writer_conn.execute("BEGIN IMMEDIATE")
+        try:
+            if many:
+                rows = _writer_conn.executemany(sql, params).fetchall()
+            else:
+                rows = _writer_conn.execute(sql, params).fetchall()
+        except Exception:
+            _writer_conn.rollback()
+            raise
+        _writer_conn.commit()
+        return rows
 
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
+    conn = _conn()
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
     c.execute("""
         CREATE TABLE IF NOT EXISTS jobs (
@@ -39,95 +117,126 @@ def init_db():
             pid INTEGER,
             priority INTEGER DEFAULT 0,
             paused INTEGER DEFAULT 0,
-            gpu TEXT
+            gpu TEXT,
+            created_ts INTEGER,
+            started_ts INTEGER,
+            finished_ts INTEGER
         )
     """)
-    for stmt in [
-        "ALTER TABLE jobs ADD COLUMN pid INTEGER",
-        "ALTER TABLE jobs ADD COLUMN priority INTEGER DEFAULT 0",
-        "ALTER TABLE jobs ADD COLUMN paused INTEGER DEFAULT 0",
-        "ALTER TABLE jobs ADD COLUMN gpu TEXT"
-    ]:
-        try:
-            c.execute(stmt)
-        except sqlite3.OperationalError:
-            pass
-    conn.commit()
-    conn.close()
+    if c.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        for stmt in [
+            "ALTER TABLE jobs ADD COLUMN pid INTEGER",
+            "ALTER TABLE jobs ADD COLUMN priority INTEGER DEFAULT 0",
+            "ALTER TABLE jobs ADD COLUMN paused INTEGER DEFAULT 0",
+            "ALTER TABLE jobs ADD COLUMN gpu TEXT",
+            "ALTER TABLE jobs ADD COLUMN created_ts INTEGER",
+            "ALTER TABLE jobs ADD COLUMN started_ts INTEGER",
+            "ALTER TABLE jobs ADD COLUMN finished_ts INTEGER"
+        ]:
+            try:
+                c.execute(stmt)
+            except sqlite3.OperationalError:
+                pass
+        for col in ("created", "started", "finished"):
+            c.execute(f"UPDATE jobs SET {col}_ts = "
+                      f"CAST(ROUND((julianday({col}_at) - 2440587.5) * 86400000) AS INTEGER) * 1000000 "
+                      f"WHERE {col}_ts IS NULL AND {col}_at IS NOT NULL")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_queue ON jobs (priority DESC, created_at) "
+                  "WHERE status = 'queued' AND paused = 0")
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     if not os.path.exists(JOB_OUT_DIR):
         os.makedirs(JOB_OUT_DIR)
 
 
 def add_job(cmd, cwd=None, priority=0, gpu=None):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    job_id = str(uuid.uuid4())[:8]
-    now = datetime.now(JST).isoformat()
+    job_id = uuid.uuid4().hex[:8]
+    ts, now = _timestamp()
     out_file = os.path.join(JOB_OUT_DIR, f"{job_id}.out")
     err_file = os.path.join(JOB_OUT_DIR, f"{job_id}.err")
-    c.execute("""INSERT INTO jobs (id, command, status, created_at, started_at, finished_at, rc, out_file, err_file, cwd, pid, priority, paused, gpu)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-              (job_id, cmd, "queued", now, None, None, None, out_file, err_file, cwd, None, priority, 0, str(gpu) if gpu is not None else None))
-    conn.commit()
-    conn.close()
+    _write("""INSERT INTO jobs (id, command, status, created_at, created_ts, out_file, err_file, cwd, priority, gpu)
+              VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)""",
+           (job_id, cmd, now, ts, out_file, err_file, cwd, priority, str(gpu) if gpu is not None else None))
+    wake_worker()
     gpu_str = f"GPU {gpu}" if gpu is not None else "CPU"
     print(f"Job {job_id} added (priority {priority}, {gpu_str}).")
     print(f"  Output log: {out_file}")
     print(f"  Error log:  {err_file}")
 
 
-def list_jobs():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""SELECT id, status, command, created_at, started_at, finished_at, rc, cwd, pid, priority, paused, gpu FROM jobs ORDER BY created_at""")
-    rows = c.fetchall()
-    print(f"{'ID':<8} {'STATUS':<10} {'PRI':<3} {'RC':<3} {'PAUSED':<6} {'PID':<6} {'GPU':<6} {'CREATED':<20} {'STARTED':<20} {'FINISHED':<20} {'CWD':<16} COMMAND")
-    for row in rows:
-        jid, status, cmd, created, started, finished, rc, cwd, pid, priority, paused, gpu = row
-        gpu_disp = gpu if gpu is not None else "CPU"
-        print(f"{jid:<8} {status:<10} {str(priority):<3} {str(rc) if rc is not None else '-':<3} "
-              f"{('yes' if paused else 'no'):<6} {str(pid) if pid else '-':<6} {gpu_disp:<6} "
-              f"{created[:19]:<20} {(started or '-')[:19]:<20} {(finished or '-')[:19]:<20} {str(cwd or '-')[:16]} {cmd}")
-    conn.close()
+def wake_worker():
+    try:
+        fd = os.open(WAKE_FIFO, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        return
+    try:
+        os.write(fd, b"\0")
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def list_jobs(show_all=False):
+    c = _conn().cursor()
+    c.execute("""SELECT * FROM (SELECT id, status, command, created_ts, started_ts, finished_ts, rc, cwd, pid, priority, paused, gpu
+                 FROM jobs ORDER BY created_ts DESC LIMIT ?) ORDER BY created_ts""",
+              (-1 if show_all else STATUS_LIMIT,))
+    d = lambda v: '-' if v is None else str(v)
+    t = lambda v: '-' if v is None else _format_ts(v)
+    row = _ROW_TPL.format
+    out_lines = [row("ID", "STATUS", "PRI", "RC", "PAUSED", "PID", "GPU",
+                     "CREATED", "STARTED", "FINISHED", "CWD", "COMMAND")]
+    for jid, status, cmd, created, started, finished, rc, cwd, pid, priority, paused, gpu in c:
+        out_lines.append(row(jid, status, d(priority), d(rc), "yes" if paused else "no", d(pid),
+                             gpu if gpu is not None else "CPU", t(created), t(started), t(finished),
+                             d(cwd)[:16], cmd))
+    sys.stdout.write("".join(out_lines))
 
 
 def show_output(job_id, err=False):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    c = _conn().cursor()
     c.execute("SELECT out_file, err_file FROM jobs WHERE id = ?", (job_id,))
     row = c.fetchone()
-    conn.close()
     if not row:
         print(f"No such job: {job_id}")
         return
     fname = row[1] if err else row[0]
-    if os.path.exists(fname):
-        with open(fname) as f:
-            print(f.read(), end='')
-    else:
+    if not os.path.exists(fname):
         print("(No output yet)")
+        return
+    with open(fname, "rb") as f:
+        if not isinstance(sys.stdout, io.TextIOWrapper):
+            sys.stdout.write(f.read().decode(errors="replace"))
+            return
+        sys.stdout.flush()
+        offset, size = 0, os.fstat(f.fileno()).st_size
+        try:
+            while offset < size:
+                sent = os.sendfile(sys.stdout.fileno(), f.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+            f.seek(offset)
+            shutil.copyfileobj(f, sys.stdout.buffer, 1 << 20)
+            sys.stdout.buffer.flush()
 
 
 def remove_job(job_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT status, pid, out_file, err_file FROM jobs WHERE id = ?", (job_id,))
-    row = c.fetchone()
-    if not row:
+    rows = _write(
+        "DELETE FROM jobs WHERE id = ? RETURNING status, pid, out_file, err_file", (job_id,))
+    if not rows:
         print(f"No such job: {job_id}")
-        conn.close()
         return
-    status, pid, out_file, err_file = row
+    status, pid, out_file, err_file = rows[0]
     if status == "running" and pid:
         try:
-            os.kill(pid, signal.SIGTERM)
+            os.killpg(pid, signal.SIGTERM)
             print(f"Sent SIGTERM to job {job_id} (PID {pid})")
         except Exception as e:
             print(f"Failed to kill process {pid}: {e}")
-    c.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
-    conn.commit()
-    conn.close()
     for fname in (out_file, err_file):
         if fname and os.path.exists(fname):
             os.remove(fname)
@@ -141,63 +250,35 @@ def remove_all_jobs(force=False):
         if confirm.lower() not in ["y", "yes"]:
             print("Aborted.")
             return
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT id, status, pid, out_file, err_file FROM jobs")
-    rows = c.fetchall()
+    rows = _write("DELETE FROM jobs RETURNING id, status, pid, out_file, err_file")
     for row in rows:
         job_id, status, pid, out_file, err_file = row
         if status == "running" and pid:
             try:
-                os.kill(pid, signal.SIGTERM)
+                os.killpg(pid, signal.SIGTERM)
                 print(f"Sent SIGTERM to job {job_id} (PID {pid})")
             except Exception as e:
                 print(f"Failed to kill process {pid}: {e}")
         for fname in (out_file, err_file):
             if fname and os.path.exists(fname):
                 os.remove(fname)
-    c.execute("DELETE FROM jobs")
-    conn.commit()
-    conn.close()
     print(f"All jobs and their logs have been removed.")
 
 
 def update_job_status(job_id, status=None, pid=None, paused=None):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    setters = []
-    params = []
-    if status is not None:
-        setters.append("status = ?")
-        params.append(status)
-    if pid is not None:
-        setters.append("pid = ?")
-        params.append(pid)
-    if paused is not None:
-        setters.append("paused = ?")
-        params.append(paused)
-    params.append(job_id)
-    if setters:
-        c.execute(f"UPDATE jobs SET {', '.join(setters)} WHERE id = ?", params)
-    conn.commit()
-    conn.close()
+    _write("UPDATE jobs SET status = COALESCE(?, status), pid = COALESCE(?, pid), paused = COALESCE(?, paused) "
+           "WHERE id = ?", (status, pid, paused, job_id))
 
 
 def set_job_paused(job_id, paused):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE jobs SET paused = ? WHERE id = ?",
-              (1 if paused else 0, job_id))
-    conn.commit()
-    conn.close()
+    _write("UPDATE jobs SET paused = ? WHERE id = ?",
+           (1 if paused else 0, job_id))
 
 
 def get_job_pid(job_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    c = _conn().cursor()
     c.execute("SELECT pid FROM jobs WHERE id = ?", (job_id,))
     row = c.fetchone()
-    conn.close()
     return row[0] if row else None
 
 
@@ -207,7 +288,7 @@ def pause_job(job_id):
         print(f"No running process found for job {job_id}")
         return
     try:
-        os.kill(pid, signal.SIGSTOP)
+        os.killpg(pid, signal.SIGSTOP)
         set_job_paused(job_id, True)
         print(f"Job {job_id} (PID {pid}) paused.")
     except Exception as e:
@@ -220,7 +301,7 @@ def resume_job(job_id):
         print(f"No running process found for job {job_id}")
         return
     try:
-        os.kill(pid, signal.SIGCONT)
+        os.killpg(pid, signal.SIGCONT)
         set_job_paused(job_id, False)
         print(f"Job {job_id} (PID {pid}) resumed.")
     except Exception as e:
@@ -233,87 +314,178 @@ def kill_job(job_id):
         print(f"No running process found for job {job_id}")
         return
     try:
-        os.kill(pid, signal.SIGTERM)
+        os.killpg(pid, signal.SIGTERM)
         print(f"Job {job_id} (PID {pid}) killed (SIGTERM sent).")
     except Exception as e:
         print(f"Failed to kill job {job_id} (PID {pid}): {e}")
 
 
-def worker(jobs=DEFAULT_JOBS):
-    lock = Lock()
-    running = {}
-    running_gpus = {}
+def _split_command(command):
+    if _SHELL_META.search(command):
+        return command, True
+    argv = shlex.split(command)
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return command, True
+    return argv, False
+
+
+def _spawn(command, **kwargs):
+    args, use_shell = _split_command(command)
+    try:
+        return subprocess.Popen(args, shell=use_shell, **kwargs)
+    except OSError as e:
+        if use_shell or e.errno not in (errno.ENOEXEC, errno.ENOENT, errno.EACCES):
+            raise
+        return subprocess.Popen(command, shell=True, **kwargs)
 
-    print(logo)
-    print(f"Starting worker with {jobs} concurrent jobs...")
 
-    def job_runner(job_row):
-        job_id, command, out_file, err_file, cwd, gpu = job_row[:6]
-        old_cwd = os.getcwd()
-        rc = 1
-        pid = None
-        now = datetime.now(JST).isoformat()
-        update_job_status(job_id, status="running")
-        env = os.environ.copy()
-        if gpu is not None:
-            env["CUDA_VISIBLE_DEVICES"] = gpu
+def _watch_wal():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(DB_FILE + "-wal"), IN_MODIFY) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def finalizer():
+    while True:
+        items = [_finalize_q.get()]
+        deadline = time.monotonic() + FINALIZE_WINDOW
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(_finalize_q.get(timeout=timeout))
+            except Empty:
+                break
         try:
-            if cwd:
-                os.chdir(os.path.expanduser(cwd))
-            with open(out_file, "w") as outf, open(err_file, "w") as errf:
-                proc = subprocess.Popen(
-                    command, shell=True, stdout=outf, stderr=errf, preexec_fn=os.setsid, env=env)
-                pid = proc.pid
-                update_job_status(job_id, pid=pid)
-                running[job_id] = proc
-                if gpu is not None:
-                    running_gpus[gpu] = job_id
-                rc = proc.wait()
+            _write("UPDATE jobs SET status = ?, finished_at = ?, finished_ts = ?, rc = ?, pid = NULL WHERE id = ?",
+                   items, many=True)
         except Exception as e:
-            with open(out_file, "w") as outf, open(err_file, "w") as errf:
-                errf.write(f"Failed to run job: {e}\n")
-        finally:
-            os.chdir(old_cwd)
-        status = "done" if rc == 0 else "failed"
-        now = datetime.now(JST).isoformat()
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE jobs SET status = ?, finished_at = ?, rc = ?, pid = NULL WHERE id = ?",
-                  (status, now, rc, job_id))
-        conn.commit()
-        conn.close()
-        with lock:
-            running.pop(job_id, None)
-            if gpu is not None and running_gpus.get(gpu) == job_id:
-                running_gpus.pop(gpu, None)
+            print(f"Failed to record {len(items)} finished job(s), retrying: {e}")
+            for item in items:
+                _finalize_q.put(item)
+            time.sleep(FINALIZE_RETRY)
+
 
+def finish_job(job_id, rc):
+    status = "done" if rc == 0 else "failed"
+    ts, now = _timestamp()
+    _finalize_q.put((status, now, ts, rc, job_id))
+
+
+def launch_job(job_row, env):
+    job_id, command, out_file, err_file, cwd, gpu = job_row
+    ts, now = _timestamp()
+    _write("UPDATE jobs SET status = 'running', started_at = ?, started_ts = ? WHERE id = ?",
+           (now, ts, job_id))
+    out_fd = err_fd = None
+    try:
+        out_fd = os.open(out_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        err_fd = os.open(err_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        proc = _spawn(
+            command, stdout=out_fd, stderr=err_fd, start_new_session=True, env=env,
+            cwd=os.path.expanduser(cwd) if cwd else None)
+    except Exception as e:
+        if err_fd is not None:
+            os.write(err_fd, f"Failed to run job: {e}\n".encode())
+        else:
+            print(f"Failed to run job {job_id}: {e}")
+        finish_job(job_id, 1)
+        return None
+    finally:
+        for fd in (out_fd, err_fd):
+            if fd is not None:
+                os.close(fd)
+    update_job_status(job_id, pid=proc.pid)
+    return proc
+
+
+def dispatch(jobs, running, base_env):
+    active_jobs = len(running)
+    used_gpus = {gpu for _, _, gpu in running.values() if gpu is not None}
+    while active_jobs < jobs:
+        c = _conn().cursor()
+        c.execute(
+            "SELECT id, command, out_file, err_file, cwd, gpu FROM jobs "
+            "WHERE status = 'queued' AND paused = 0 "
+            f"AND (gpu IS NULL OR gpu NOT IN ({', '.join('?' * len(used_gpus))})) "
+            "ORDER BY priority DESC, created_at LIMIT ?", (*used_gpus, jobs - active_jobs))
+        rows = c.fetchall()
+        if not rows:
+            return
+        for row in rows:
+            job_id, gpu = row[0], row[5]
+            if gpu is not None and gpu in used_gpus:
+                continue
+            env = base_env if gpu is None else {**base_env, "CUDA_VISIBLE_DEVICES": gpu}
+            proc = launch_job(row, env)
+            if proc is None:
+                continue
+            running[proc.pid] = (job_id, proc, gpu)
+            if gpu is not None:
+                used_gpus.add(gpu)
+            active_jobs += 1
+            if active_jobs >= jobs:
+                return
+
+
+def reap_jobs(running):
     while True:
-        with lock:
-            active_jobs = len(running)
-            used_gpus = set(running_gpus.keys())
-        if active_jobs < jobs:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute(
-                "SELECT id, command, out_file, err_file, cwd, gpu FROM jobs "
-                "WHERE status = 'queued' AND paused = 0 "
-                "ORDER BY priority DESC, created_at")
-            rows = c.fetchall()
-            conn.close()
-            launch_cnt = 0
-            for row in rows:
-                job_id, _, _, _, _, gpu = row
-                if gpu is not None and gpu in used_gpus:
-                    continue
-                t = Thread(target=job_runner, args=(row,))
-                t.daemon = True
-                t.start()
-                launch_cnt += 1
-                if gpu is not None:
-                    used_gpus.add(gpu)
-                if active_jobs + launch_cnt >= jobs:
-                    break
-        time.sleep(2)
+        try:
+            info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        except ChildProcessError:
+            return
+        if info is None:
+            return
+        entry = running.pop(info.si_pid, None)
+        if entry is None:
+            os.waitpid(info.si_pid, 0)
+            continue
+        job_id, proc, _ = entry
+        finish_job(job_id, proc.wait())
+
+
+def worker(jobs=DEFAULT_JOBS):
+    running = {}
+    base_env = dict(os.environ)
+    ep = select.epoll()
+    if not os.path.exists(WAKE_FIFO):
+        os.mkfifo(WAKE_FIFO)
+    fifo_fd = os.open(WAKE_FIFO, os.O_RDWR | os.O_NONBLOCK)
+    ep.register(fifo_fd, select.EPOLLIN)
+    sig_r, sig_w = os.pipe()
+    os.set_blocking(sig_r, False)
+    os.set_blocking(sig_w, False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(sig_w, warn_on_full_buffer=False)
+    ep.register(sig_r, select.EPOLLIN)
+    _conn()
+    wal_fd = _watch_wal()
+    if wal_fd is not None:
+        ep.register(wal_fd, select.EPOLLIN)
+
+    print(_load_logo())
+    print(f"Starting worker with {jobs} concurrent jobs...")
+
+    Thread(target=finalizer, daemon=True).start()
+
+    while True:
+        reap_jobs(running)
+        dispatch(jobs, running, base_env)
+        for fd, _ in ep.poll(30):
+            try:
+                while os.read(fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
 
 
 def main():
@@ -334,6 +506,8 @@ def main():
 
     status_parser = subparsers.add_parser(
         'status', help='List jobs and status')
+    status_parser.add_argument('--all', action='store_true',
+                               help=f'Show all jobs (default: latest {STATUS_LIMIT})')
 
     output_parser = subparsers.add_parser('output', help='Show job stdout')
     output_parser.add_argument('jobid', type=str, help='Job ID')
@@ -370,7 +544,7 @@ def main():
     if args.command == "add":
         add_job(args.cmd, args.cwd, args.priority, args.gpu)
     elif args.command == "status":
-        list_jobs()
+        list_jobs(show_all=args.all)
     elif args.command == "output":
         show_output(args.jobid, err=False)
     elif args.command == "error":